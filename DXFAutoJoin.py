@@ -16,173 +16,228 @@
 # along with this program. If not, see <https://www.gnu.org/licenses/>.
 # ------------------------------------------------------------------------------
 
-import math
 import ezdxf
 import re
+import numpy as np
+from scipy.cluster.hierarchy import DisjointSet
+from scipy.spatial import cKDTree
+
+_DIGIT_RE = re.compile(r'\d+')
 
 def distance_2d(p1, p2):
-    """Euclidean distance in 2D."""
-    return math.hypot(p2[0] - p1[0], p2[1] - p1[1])
+    """Euclidean distance in 2D, for points or (N, 2) arrays of points."""
+    p1 = np.asarray(p1)
+    p2 = np.asarray(p2)
+    return np.hypot(p2[..., 0] - p1[..., 0], p2[..., 1] - p1[..., 1])
 
 def angle_of_point(center, pt):
     """
     Return angle in degrees [0..360) from center->pt, CCW from +X axis.
+    Works on single points or (N, 2) arrays of points.
     """
-    dx = pt[0] - center[0]
-    dy = pt[1] - center[1]
-    return math.degrees(math.atan2(dy, dx)) % 360
+    center = np.asarray(center)
+    pt = np.asarray(pt)
+    dx = pt[..., 0] - center[..., 0]
+    dy = pt[..., 1] - center[..., 1]
+    return np.degrees(np.arctan2(dy, dx)) % 360
 
 def normalize_arc_angles(start_angle, end_angle):
     """
     Make sure arcs are CCW in [0..360 or 0..720).
     If end_angle < start_angle, add 360 so it's a positive sweep.
+    Works element-wise on arrays of angles.
     Returns (start_angle, end_angle, sweep).
     """
-    s = start_angle % 360
-    e = end_angle % 360
+    s = np.mod(start_angle, 360)
+    e = np.mod(end_angle, 360)
+    e = np.where(e - s < 0, e + 360, e)
     sweep = e - s
-    if sweep < 0:
-        e += 360
-        sweep = e - s
     return s, e, sweep
 
 def point_on_arc(center, radius, angle_deg):
-    """Return (x,y) on the circle for given center+radius+angle."""
-    a = math.radians(angle_deg)
-    return (center[0] + radius * math.cos(a),
-            center[1] + radius * math.sin(a))
+    """
+    Return (x, y) on the circle for given center+radius+angle.
+    With (N, 2) centers and (N,) radii/angles, x and y are (N,) arrays.
+    """
+    center = np.asarray(center)
+    a = np.radians(angle_deg)
+    return (center[..., 0] + radius * np.cos(a),
+            center[..., 1] + radius * np.sin(a))
+
+def entities_by_type(msp):
+    """
+    Sort the modelspace entities by DXF type in a single pass:
+    {'LINE': [...], 'ARC': [...], 'SPLINE': [...], 'CIRCLE': [...],
+     'OTHER': [... everything else ...]}
+    """
+    by_type = {"LINE": [], "ARC": [], "SPLINE": [], "CIRCLE": [], "OTHER": []}
+    other = by_type["OTHER"]
+    for e in msp:
+        by_type.get(e.dxftype(), other).append(e)
+    return by_type
 
-def extract_entities(msp):
+def extract_entities(by_type):
     """
-    Return a list of entities with a uniform data structure:
+    Given entities_by_type() lists, return the lines, arcs and splines as
+    parallel arrays, one row per entity (lines first, then arcs, then splines):
       {
-        'type': 'LINE', 'ARC', or 'SPLINE',
-        'start': (x1, y1),
-        'end':   (x2, y2),
-        'handle': 'entity_handle',  # Unique Handle ID
-        -- for arcs only:
-        'center': (cx, cy),
-        'radius': r,
-        'start_angle': sa,
-        'end_angle': ea,
+        'types':   (N,) array of 'LINE', 'ARC', or 'SPLINE',
+        'handles': list of N entity handles,  # Unique Handle IDs
+        'starts':  (N, 2) array of (x1, y1),
+        'ends':    (N, 2) array of (x2, y2),
+        -- for arcs only, NaN for other rows:
+        'centers': (N, 2) array of (cx, cy),
+        'radii':   (N,) array of r,
+        'start_angles': (N,) array of sa,
+        'end_angles':   (N,) array of ea,
       }
     """
-    result = []
-
-    # Lines
-    for ln in msp.query("LINE"):
-        start = (ln.dxf.start.x, ln.dxf.start.y)
-        end   = (ln.dxf.end.x,   ln.dxf.end.y)
-        result.append({
-            "type": "LINE",
-            "start": start,
-            "end": end,
-            "handle": ln.dxf.handle,  # Track Handle ID
-        })
-
-    # Arcs
-    for arc in msp.query("ARC"):
-        center = (arc.dxf.center.x, arc.dxf.center.y)
-        radius = arc.dxf.radius
-        sa_deg = arc.dxf.start_angle
-        ea_deg = arc.dxf.end_angle
-        # Arc endpoints
-        arc_start = point_on_arc(center, radius, sa_deg)
-        arc_end   = point_on_arc(center, radius, ea_deg)
-        # Normalize angles CCW
-        sa_norm, ea_norm, _ = normalize_arc_angles(sa_deg, ea_deg)
-
-        result.append({
-            "type": "ARC",
-            "center": center,
-            "radius": radius,
-            "start_angle": sa_norm,
-            "end_angle": ea_norm,
-            "start": arc_start,
-            "end": arc_end,
-            "handle": arc.dxf.handle,  # Track Handle ID
-        })
-
-    # Splines
-    for spline in msp.query("SPLINE"):
-        # Use the start and end points of the spline
-        start = tuple(spline.control_points[0])  # First control point
-        end = tuple(spline.control_points[-1])  # Last control point
-        result.append({
-            "type": "SPLINE",
-            "start": start,
-            "end": end,
-            "handle": spline.dxf.handle,  # Track Handle ID
-        })
-
-    return result
+    # Lines: (x1, y1, x2, y2)
+    line_rows = []
+    line_handles = []
+    for ln in by_type["LINE"]:
+        line_rows.append((ln.dxf.start.x, ln.dxf.start.y, ln.dxf.end.x, ln.dxf.end.y))
+        line_handles.append(ln.dxf.handle)
+
+    # Arcs: (cx, cy, r, start_angle, end_angle)
+    arc_rows = []
+    arc_handles = []
+    for arc in by_type["ARC"]:
+        arc_rows.append((arc.dxf.center.x, arc.dxf.center.y, arc.dxf.radius,
+                         arc.dxf.start_angle, arc.dxf.end_angle))
+        arc_handles.append(arc.dxf.handle)
+
+    # Splines: use the first and last control points, (x1, y1, x2, y2)
+    spline_rows = []
+    spline_handles = []
+    for spline in by_type["SPLINE"]:
+        first = spline.control_points[0]
+        last = spline.control_points[-1]
+        spline_rows.append((first[0], first[1], last[0], last[1]))
+        spline_handles.append(spline.dxf.handle)
+
+    line_rows = np.asarray(line_rows, dtype=np.float64).reshape(-1, 4)
+    arc_rows = np.asarray(arc_rows, dtype=np.float64).reshape(-1, 5)
+    spline_rows = np.asarray(spline_rows, dtype=np.float64).reshape(-1, 4)
+
+    # Arc endpoints, and angles normalized CCW
+    arc_centers = arc_rows[:, 0:2]
+    arc_radii = arc_rows[:, 2]
+    arc_starts = np.column_stack(point_on_arc(arc_centers, arc_radii, arc_rows[:, 3]))
+    arc_ends = np.column_stack(point_on_arc(arc_centers, arc_radii, arc_rows[:, 4]))
+    sa_norm, ea_norm, _ = normalize_arc_angles(arc_rows[:, 3], arc_rows[:, 4])
+
+    n_lines = len(line_rows)
+    n_arcs = len(arc_rows)
+    n = n_lines + n_arcs + len(spline_rows)
+    arc_slice = slice(n_lines, n_lines + n_arcs)
+
+    centers = np.full((n, 2), np.nan)
+    radii = np.full(n, np.nan)
+    start_angles = np.full(n, np.nan)
+    end_angles = np.full(n, np.nan)
+    centers[arc_slice] = arc_centers
+    radii[arc_slice] = arc_radii
+    start_angles[arc_slice] = sa_norm
+    end_angles[arc_slice] = ea_norm
+
+    return {
+        "types": np.array(["LINE"] * n_lines + ["ARC"] * n_arcs +
+                          ["SPLINE"] * len(spline_rows)),
+        "handles": line_handles + arc_handles + spline_handles,
+        "starts": np.concatenate((line_rows[:, 0:2], arc_starts, spline_rows[:, 0:2])),
+        "ends": np.concatenate((line_rows[:, 2:4], arc_ends, spline_rows[:, 2:4])),
+        "centers": centers,
+        "radii": radii,
+        "start_angles": start_angles,
+        "end_angles": end_angles,
+    }
 
 def unify_endpoints(entities, tolerance=1e-3):
     """
     1) Gather endpoints (start+end).
     2) Merge points within 'tolerance'.
-    3) Update entity endpoints.
+    3) Update entity endpoints, and number the merged points: 'points' is
+       the (M, 2) array of merged points, 'start_ids' / 'end_ids' give each
+       entity's endpoints as rows of it.
     4) For arcs, recalc angles if needed.
     """
-    # Gather all endpoints
-    all_pts = []
-    for e in entities:
-        all_pts.append(e["start"])
-        all_pts.append(e["end"])
-
-    # Merge
-    merged = []
-    point_map = {}
-    for p in all_pts:
-        found = False
-        for mp in merged:
-            if distance_2d(p, mp) <= tolerance:
-                point_map[p] = mp
-                found = True
-                break
-        if not found:
-            merged.append(p)
-            point_map[p] = p
+    # Gather all endpoints, as start0, end0, start1, end1, ...
+    all_pts = np.hstack((entities["starts"], entities["ends"])).reshape(-1, 2)
+
+    # Merge: walk the distinct points in input order. A point within
+    # 'tolerance' of an already accepted merged point maps to the earliest
+    # one; otherwise it becomes a new merged point. Merges never chain, so
+    # no endpoint moves by more than 'tolerance'. The KD-tree gives each
+    # point's neighbours within 'tolerance' in one query.
+    unique_pts, first_idx, inverse = np.unique(
+        all_pts, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    unique_ids = np.empty(len(unique_pts), dtype=np.intp)
+    merged = []  # unique point index of each merged point
+    if len(unique_pts):
+        tree = cKDTree(unique_pts)
+        neighbours = tree.query_ball_point(unique_pts, tolerance)
+        merged_id = [-1] * len(unique_pts)  # id, if the point was accepted
+        for idx in np.argsort(first_idx, kind="stable").tolist():
+            best = -1
+            for other in neighbours[idx]:
+                m_id = merged_id[other]
+                if m_id >= 0 and (best < 0 or m_id < best):
+                    best = m_id
+            if best < 0:
+                best = len(merged)
+                merged_id[idx] = best
+                merged.append(idx)
+            unique_ids[idx] = best
+    points = unique_pts[merged].reshape(-1, 2)
 
     # Update
-    for e in entities:
-        s_new = point_map[e["start"]]
-        e_new = point_map[e["end"]]
-        e["start"] = s_new
-        e["end"]   = e_new
-
-        if e["type"] == "ARC":
-            c = e["center"]
-            # new radius as average distance
-            r1 = distance_2d(c, s_new)
-            r2 = distance_2d(c, e_new)
-            r_avg = 0.5*(r1 + r2)
-            e["radius"] = r_avg
-
-            sa = angle_of_point(c, s_new)
-            ea = angle_of_point(c, e_new)
-            sa, ea, _ = normalize_arc_angles(sa, ea)
-            e["start_angle"] = sa
-            e["end_angle"]   = ea
-
+    point_ids = unique_ids[inverse]
+    start_ids = point_ids[0::2]
+    end_ids = point_ids[1::2]
+    starts = points[start_ids]
+    ends = points[end_ids]
+
+    arcs = entities["types"] == "ARC"
+    c = entities["centers"][arcs]
+    # new radius as average distance
+    radii = entities["radii"].copy()
+    radii[arcs] = 0.5 * (distance_2d(c, starts[arcs]) + distance_2d(c, ends[arcs]))
+
+    sa = angle_of_point(c, starts[arcs])
+    ea = angle_of_point(c, ends[arcs])
+    sa, ea, _ = normalize_arc_angles(sa, ea)
+    start_angles = entities["start_angles"].copy()
+    end_angles = entities["end_angles"].copy()
+    start_angles[arcs] = sa
+    end_angles[arcs] = ea
+
+    entities.update({
+        "starts": starts,
+        "ends": ends,
+        "points": points,
+        "start_ids": start_ids,
+        "end_ids": end_ids,
+        "radii": radii,
+        "start_angles": start_angles,
+        "end_angles": end_angles,
+    })
     return entities
 
 def build_adjacency(entities):
     """
-    Each entity is an 'edge' from e["start"] to e["end"].
+    Each entity is an 'edge' from its start_id to its end_id.
     We'll build adjacency so we can find connected sets.
     
-    adjacency[node] = list of entity indices that start/end at 'node'.
+    adjacency[node_id] = list of entity indices that start/end at 'node_id'.
     """
-    adjacency = {}
-    def add_node(p, ent_idx):
-        if p not in adjacency:
-            adjacency[p] = []
-        adjacency[p].append(ent_idx)
+    adjacency = [[] for _ in range(len(entities["points"]))]
 
-    for i, e in enumerate(entities):
-        add_node(e["start"], i)
-        add_node(e["end"],   i)
+    for i, (s_id, e_id) in enumerate(zip(entities["start_ids"].tolist(),
+                                         entities["end_ids"].tolist())):
+        adjacency[s_id].append(i)
+        adjacency[e_id].append(i)
 
     return adjacency
 
@@ -191,67 +246,53 @@ def find_connected_groups(entities):
     Return a list of groups, each group is a set of entity indices
     that connect to each other via shared endpoints.
     """
+    num_entities = len(entities["handles"])
     adjacency = build_adjacency(entities)
-    visited = set()
-    groups = []
-
-    # We do an entity-based BFS/DFS for each unvisited entity.
-    ent_adjacency = {i: set() for i in range(len(entities))}
-
-    # Build adjacency of entities: any that share a node are connected
-    for node, ent_list in adjacency.items():
-        # All entities in 'ent_list' share this node, so they're connected
-        for e1 in ent_list:
-            for e2 in ent_list:
-                if e1 != e2:
-                    ent_adjacency[e1].add(e2)
-
-    def bfs(start_ent):
-        queue = [start_ent]
-        connected = {start_ent}
-        while queue:
-            cur = queue.pop(0)
-            for neigh in ent_adjacency[cur]:
-                if neigh not in connected:
-                    connected.add(neigh)
-                    queue.append(neigh)
-        return connected
-
-    for ent_idx in range(len(entities)):
-        if ent_idx not in visited:
-            group = bfs(ent_idx)
-            groups.append(group)
-            visited |= group
-
-    return groups
+    ds = DisjointSet(range(num_entities))
+
+    # All entities in an adjacency list share that node, so they're connected.
+    # Merging each one with the first is enough to put them in one subset.
+    for ent_list in adjacency:
+        if not ent_list:
+            continue
+        first = ent_list[0]
+        for other in ent_list[1:]:
+            ds.merge(first, other)
+
+    # Bucket entities by subset root; groups come out ordered by their
+    # lowest entity index.
+    groups_by_root = {}
+    for ent_idx in range(num_entities):
+        groups_by_root.setdefault(ds[ent_idx], set()).add(ent_idx)
+
+    return list(groups_by_root.values())
 
 # ------------------------------------------------------------------------------
 # BELOW: Logic to "pre-join" lines into polylines
 # ------------------------------------------------------------------------------
 
-def build_line_adjacency(lines):
+def build_line_adjacency(line_starts, line_ends):
     """
-    lines is a list of indices or dictionaries that represent line segments.
-    We'll build adjacency on endpoints to find chain(s).
-    adjacency[node] = list of line indices that start or end at node
+    line_starts / line_ends are the endpoint ids of each line segment.
+    We'll build adjacency on endpoint ids to find chain(s).
+    adjacency[node_id] = set of line indices that start or end at node_id
     """
     adjacency = {}
-    def add_node(p, line_idx):
-        if p not in adjacency:
-            adjacency[p] = []
-        adjacency[p].append(line_idx)
-
-    for i, ln in enumerate(lines):
-        s = ln["start"]
-        e = ln["end"]
-        add_node(s, i)
-        add_node(e, i)
+    def add_node(p_id, line_idx):
+        if p_id not in adjacency:
+            adjacency[p_id] = set()
+        adjacency[p_id].add(line_idx)
+
+    for i, (s_id, e_id) in enumerate(zip(line_starts, line_ends)):
+        add_node(s_id, i)
+        add_node(e_id, i)
     return adjacency
 
-def chain_lines(lines):
+def chain_lines(entities, line_idxs):
     """
-    lines: a list of dicts { 'type':'LINE', 'start':(x,y), 'end':(x,y) }
-    Return a list of polylines, each polyline is a list of vertices (x, y).
+    entities: the arrays returned by unify_endpoints
+    line_idxs: indices of the LINE entities to chain
+    Return a list of polylines, each polyline is a (P, 2) array of vertices.
     We find all possible "chains" of lines in the set. If there's branching, we
     produce multiple polylines.
 
@@ -260,139 +301,184 @@ def chain_lines(lines):
       We then walk forward as far as we can (matching end->start) and also backward
       if it can keep going from start->some other line's end, etc.
     """
-    if not lines:
+    if len(line_idxs) == 0:
         return []
 
-    adjacency = build_line_adjacency(lines)
-    visited = set()  # set of line indices already in a chain
+    # Walks run on point ids; map them back to (x, y) for the output
+    line_starts = entities["start_ids"][line_idxs].tolist()
+    line_ends = entities["end_ids"][line_idxs].tolist()
+    points = entities["points"]
+    adjacency = build_line_adjacency(line_starts, line_ends)
+    visited = bytearray(len(line_starts))  # 1 for lines already in a chain
     polylines = []
 
-    # Helper to get the "other" endpoint
-    def other_end(line, pt):
-        # line has start, end
-        # if pt == line['start'] => other = line['end']
-        # if pt == line['end']   => other = line['start']
-        if distance_2d(pt, line["start"]) < 1e-12:
-            return line["end"]
-        else:
-            return line["start"]
-
-    for i, ln in enumerate(lines):
-        if i in visited:
+    # The "other" endpoint id of a line reached at pt_id is
+    # other_end[line_idx] ^ pt_id: start ^ end ^ start == end and vice versa
+    other_end = [s_id ^ e_id for s_id, e_id in zip(line_starts, line_ends)]
+
+    # Mark a line as used and drop it from both of its endpoints, so nodes
+    # only ever hold lines that are still available
+    def take(line_idx):
+        visited[line_idx] = 1
+        adjacency[line_starts[line_idx]].discard(line_idx)
+        adjacency[line_ends[line_idx]].discard(line_idx)
+
+    for i in range(len(line_starts)):
+        if visited[i]:
             continue
         # Start a chain from this line
-        chain = []
-        visited.add(i)
+        take(i)
 
-        # We'll treat ln's direction as start->end
-        chain_pts = [ln["start"], ln["end"]]
+        # We'll treat the line's direction as start->end
+        chain_ids = [line_starts[i], line_ends[i]]
 
-        # Walk forward from ln["end"]
-        forward_current = ln["end"]
+        # Walk forward from the line's end
+        forward_current = line_ends[i]
         while True:
-            # all lines connected at forward_current
-            candidates = adjacency.get(forward_current, [])
-            found_next = False
-            for nxt_idx in candidates:
-                if nxt_idx not in visited:
-                    # check the other endpoint
-                    nxt_line = lines[nxt_idx]
-                    # if forward_current is nxt_line["start"], next is nxt_line["end"]
-                    # or vice versa
-                    # We'll unify them in the chain
-                    visited.add(nxt_idx)
-                    nxt_other = other_end(nxt_line, forward_current)
-                    chain_pts.append(nxt_other)
-                    forward_current = nxt_other
-                    found_next = True
-                    break
-            if not found_next:
+            # any unused line connected at forward_current
+            nxt_idx = next(iter(adjacency[forward_current]), None)
+            if nxt_idx is None:
                 break
-
-        # Walk backward from ln["start"]
-        backward_current = ln["start"]
-        # We'll do it in *front* of chain_pts
+            take(nxt_idx)
+            nxt_other = other_end[nxt_idx] ^ forward_current
+            chain_ids.append(nxt_other)
+            forward_current = nxt_other
+
+        # Walk backward from the line's start
+        backward_current = line_starts[i]
+        # These go in *front* of chain_ids; collected in walk order and
+        # reversed once at the end
         prefix = []
         while True:
-            candidates = adjacency.get(backward_current, [])
-            found_prev = False
-            for nxt_idx in candidates:
-                if nxt_idx not in visited:
-                    visited.add(nxt_idx)
-                    nxt_line = lines[nxt_idx]
-                    nxt_other = other_end(nxt_line, backward_current)
-                    # Insert at front of prefix
-                    prefix.insert(0, nxt_other)
-                    backward_current = nxt_other
-                    found_prev = True
-                    break
-            if not found_prev:
+            nxt_idx = next(iter(adjacency[backward_current]), None)
+            if nxt_idx is None:
                 break
+            take(nxt_idx)
+            nxt_other = other_end[nxt_idx] ^ backward_current
+            prefix.append(nxt_other)
+            backward_current = nxt_other
 
-        # Now final chain of points is prefix + chain_pts
-        final_pts = prefix + chain_pts
-        polylines.append(final_pts)
+        # Now final chain of points is reversed prefix + chain_ids
+        prefix.reverse()
+        polylines.append(points[prefix + chain_ids])
 
     return polylines
 
-def approximate_arc(arc, num_segments=20):
+def approximate_arc(entities, arc_idx, num_segments=20):
     """
     Approximate an arc as a series of line segments.
+    Returns (xs, ys, handle): the num_segments+1 points along the arc as
+    coordinate arrays, consecutive points forming one segment.
     """
-    center = arc["center"]
-    radius = arc["radius"]
-    start_angle = arc["start_angle"]
-    end_angle = arc["end_angle"]
-
-    # Generate points along the arc
-    points = []
-    for i in range(num_segments + 1):
-        angle = start_angle + i * (end_angle - start_angle) / num_segments
-        points.append(point_on_arc(center, radius, angle))
+    cx, cy = entities["centers"][arc_idx]
+    radius = entities["radii"][arc_idx]
+    angles = np.linspace(entities["start_angles"][arc_idx],
+                         entities["end_angles"][arc_idx], num_segments + 1)
+    rad = np.deg2rad(angles)
+    xs = cx + radius * np.cos(rad)
+    ys = cy + radius * np.sin(rad)
+    return xs, ys, entities["handles"][arc_idx]
+
+def polygon_edge_arrays(paths):
+    """
+    Turn a polygon, given as a list of (xs, ys) vertex paths (joined
+    polylines and approximated arcs), into edge coordinate arrays
+    (x1, y1, x2, y2), one entry per segment between consecutive vertices.
+    """
+    if not paths:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty, empty, empty
+    return (np.concatenate([xs[:-1] for xs, _ in paths]),
+            np.concatenate([ys[:-1] for _, ys in paths]),
+            np.concatenate([xs[1:] for xs, _ in paths]),
+            np.concatenate([ys[1:] for _, ys in paths]))
+
+def polygon_vertices(poly_arrays):
+    """
+    Return the distinct segment endpoints of a polygon's edge arrays as a
+    (V, 2) array. Consecutive segments share endpoints, so this is about
+    half of the 2 * E raw endpoints.
+    """
+    x1, y1, x2, y2 = poly_arrays
+    pts = np.column_stack((np.concatenate((x1, x2)), np.concatenate((y1, y2))))
+    return np.unique(pts, axis=0)
 
-    # Convert points to line segments
-    segments = []
-    for i in range(len(points) - 1):
-        segments.append({"start": points[i], "end": points[i + 1], "handle": arc["handle"]})
-    return segments
+def polygon_bbox(vertices):
+    """
+    Return the axis-aligned bounding box (xmin, ymin, xmax, ymax) of a
+    polygon's vertices, or None for an empty polygon.
+    """
+    if len(vertices) == 0:
+        return None
+    (xmin, ymin), (xmax, ymax) = vertices.min(axis=0), vertices.max(axis=0)
+    return xmin, ymin, xmax, ymax
 
-def is_point_in_polygon(point, polygon):
+def stack_bboxes(bboxes):
     """
-    Use the ray-casting algorithm to determine if a point is inside a polygon.
+    Stack polygon_bbox results into a (P, 4) array; None (empty polygon)
+    becomes a row of NaN, which never contains anything.
     """
-    x, y = point
-    inside = False
+    rows = [bbox if bbox is not None else (np.nan,) * 4 for bbox in bboxes]
+    return np.array(rows, dtype=np.float64).reshape(-1, 4)
 
-    for i in range(len(polygon)):
-        x1, y1 = polygon[i]["start"]
-        x2, y2 = polygon[i]["end"]
+def bboxes_containing(boxes, inner):
+    """
+    Return the indices, ascending, of the (P, 4) `boxes` that bounding box
+    `inner` lies within.
+    """
+    return np.flatnonzero((boxes[:, 0] <= inner[0]) & (boxes[:, 1] <= inner[1]) &
+                          (boxes[:, 2] >= inner[2]) & (boxes[:, 3] >= inner[3]))
 
-        # Check if the point is within the y-range of the edge
-        if (y1 > y) != (y2 > y):
-            # Compute the x-coordinate of the intersection of the edge with the ray
+def _points_in_polygon_blocks(pts_xy, poly_arrays):
+    """
+    Ray-cast the (Q, 2) query points against the polygon's edge arrays in
+    blocks of rows, so the (rows, E) temporaries stay near a million
+    elements however large Q and E grow. Yields one boolean array per block.
+    """
+    x1, y1, x2, y2 = poly_arrays
+    step = max(1, 1_000_000 // max(len(x1), 1))
+    for start in range(0, len(pts_xy), step):
+        block = pts_xy[start:start + step]
+        x = block[:, 0][:, None]
+        y = block[:, 1][:, None]
+
+        # Edges spanning each point's y, and where they cross the ray
+        cond = (y1 > y) != (y2 > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
             x_intersect = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
-            if x < x_intersect:
-                inside = not inside
+        hits = cond & (x < x_intersect)
+        yield (hits.sum(axis=1) & 1).astype(bool)
 
-    return inside
+def points_in_polygon(pts_xy, poly_arrays):
+    """
+    Use the ray-casting algorithm to determine which of the (Q, 2) query
+    points are inside the polygon given by its edge arrays.
+    Returns a boolean array of shape (Q,).
+    """
+    return np.concatenate([np.zeros(0, dtype=bool),
+                           *_points_in_polygon_blocks(pts_xy, poly_arrays)])
+
+def is_point_in_polygon(point, poly_arrays):
+    """
+    Use the ray-casting algorithm to determine if a point is inside a polygon.
+    """
+    pts = np.array([point[:2]], dtype=np.float64)
+    return bool(points_in_polygon(pts, poly_arrays)[0])
 
-def is_polygon_in_polygon(inner_polygon, outer_polygon):
+def is_polygon_in_polygon(inner_vertices, outer_arrays):
     """
-    Check if all points of `inner_polygon` are inside `outer_polygon`.
+    Check if all points of the inner polygon (its polygon_vertices) are
+    inside the outer polygon, stopping at the first block of points with
+    one outside.
     """
-    for segment in inner_polygon:
-        if not is_point_in_polygon(segment["start"], outer_polygon):
-            return False
-        if not is_point_in_polygon(segment["end"], outer_polygon):
-            return False
-    return True
+    return all(block.all() for block in _points_in_polygon_blocks(inner_vertices, outer_arrays))
 
 def extract_numeric_layer_name(layer_name):
     """
     Extract all digits from the layer name and return them as a single integer.
     If no digits are found, return 0.
     """
-    digits = re.findall(r'\d+', layer_name)  # Find all numeric parts
+    digits = _DIGIT_RE.findall(layer_name)  # Find all numeric parts
     if digits:
         return int(''.join(digits))  # Combine and convert to an integer
     return 0
@@ -415,7 +501,8 @@ def unify_to_layers_in_place(input_dxf, output_dxf, tolerance=0.01):
         print(f"Please use the 2018 format if you want units to work properly in Affinity Designer (import as 'all pages').")
 
     # 1) Extract lines/arcs
-    entities = extract_entities(msp_in)
+    by_type = entities_by_type(msp_in)
+    entities = extract_entities(by_type)
 
     # 2) Merge endpoints
     entities = unify_endpoints(entities, tolerance=tolerance)
@@ -425,25 +512,33 @@ def unify_to_layers_in_place(input_dxf, output_dxf, tolerance=0.01):
 
     # 4) Modify the existing modelspace
     polygons = []  # Store all polygons for containment checks
+    final_layer_by_handle = {}  # Layer of every entity we create or move
+    types = entities["types"]
+    handles = entities["handles"]
+    ent_by_handle = {e.dxf.handle: e for t in ("LINE", "ARC", "SPLINE") for e in by_type[t]}
+    to_delete = []  # Original lines replaced by polylines
     for i, group in enumerate(groups):
-        # Build a list of entity dicts for that group
-        group_ents = [entities[idx] for idx in group]
+        # Entity indices of that group
+        group_idxs = np.fromiter(group, dtype=np.intp, count=len(group))
+        group_types = types[group_idxs]
 
         # Separate lines, arcs, and splines
-        lines = [e for e in group_ents if e["type"] == "LINE"]
-        arcs = [e for e in group_ents if e["type"] == "ARC"]
-        splines = [e for e in group_ents if e["type"] == "SPLINE"]
+        lines = group_idxs[group_types == "LINE"]
+        arcs = group_idxs[group_types == "ARC"]
+        splines = group_idxs[group_types == "SPLINE"]
 
         # Create a unique layer for this group
         layer_name = f"Part {i+1}"
-        if arcs or splines:
+        if len(arcs) or len(splines):
             layer_name = f"{layer_name} - Join Manually!"
         if not doc_in.layers.has_entry(layer_name):
             doc_in.layers.new(name=layer_name)
 
-        polygon = []
+        # The polygon as vertex paths, and the handles of its entities
+        poly_paths = []
+        poly_handles = []
         # 5) Add joined polylines for lines and remove original lines
-        line_polylines = chain_lines(lines)  # each is a list of (x, y)
+        line_polylines = chain_lines(entities, lines)  # each is a (P, 2) array
         for poly_pts in line_polylines:
             if len(poly_pts) < 2:
                 continue
@@ -452,85 +547,103 @@ def unify_to_layers_in_place(input_dxf, output_dxf, tolerance=0.01):
                 format="xy",
                 dxfattribs={"layer": layer_name}
             )
+            ent_by_handle[new_polyline.dxf.handle] = new_polyline
+            final_layer_by_handle[new_polyline.dxf.handle] = layer_name
             # Store the handle of the new polyline
-            for i in range(len(poly_pts) - 1):
-                polygon.append({"start": poly_pts[i], "end": poly_pts[i+1], "handle": new_polyline.dxf.handle})
+            poly_paths.append((poly_pts[:, 0], poly_pts[:, 1]))
+            poly_handles.append(new_polyline.dxf.handle)
 
-        # Remove original lines from the modelspace
-        for line in lines:
-            handle = line["handle"]
-            original_entity = doc_in.entitydb.get(handle)
-            if original_entity:
-                msp_in.delete_entity(original_entity)
+        # Original lines are removed from the modelspace after all groups
+        for idx in lines:
+            to_delete.append(ent_by_handle[handles[idx]])
 
         # Assign splines to the new layer
-        for spline in splines:
-            handle = spline["handle"]
-            original_spline = doc_in.entitydb.get(handle)
-            if original_spline:
-                original_spline.dxf.layer = layer_name
+        for idx in splines:
+            final_layer_by_handle[handles[idx]] = layer_name
 
         # 6) Update arcs to the new layer
-        for arc in arcs:
-            handle = arc["handle"]
-            original_arc = doc_in.entitydb.get(handle)
-            if original_arc:
-                # Move the original arc to the new layer
-                original_arc.dxf.layer = layer_name
+        for idx in arcs:
+            final_layer_by_handle[handles[idx]] = layer_name
 
         # Approximate arcs as line segments and store the polygon
-        for ent in group_ents:
-            if ent["type"] == "ARC":
-                polygon.extend(approximate_arc(ent))
-        polygons.append((polygon, layer_name))
+        for idx in arcs:
+            xs, ys, handle = approximate_arc(entities, idx)
+            poly_paths.append((xs, ys))
+            poly_handles.append(handle)
+        poly_arrays = polygon_edge_arrays(poly_paths)
+        vertices = polygon_vertices(poly_arrays)
+        polygons.append((poly_handles, poly_arrays, vertices, polygon_bbox(vertices), layer_name))
 
     # 7) Check for polygon containment
-    for i, (inner_polygon, inner_layer) in enumerate(polygons):
-        for j, (outer_polygon, outer_layer) in enumerate(polygons):
-            if i != j and is_polygon_in_polygon(inner_polygon, outer_polygon):
+    # Only ray-cast pairs whose bounding boxes nest, found for each inner
+    # polygon with one mask over all boxes; empty polygons have no points to
+    # move and can never contain anything. Unlike a bare parity test, this
+    # never reports containment outside the outer box, which open chains and
+    # outlines with internal chords or T-junctions could otherwise produce.
+    boxes = stack_bboxes(bbox for _, _, _, bbox, _ in polygons)
+    for i, (inner_handles, inner_arrays, inner_vertices, inner_bbox, inner_layer) in enumerate(polygons):
+        if inner_bbox is None:
+            continue
+        for j in bboxes_containing(boxes, inner_bbox).tolist():
+            outer_handles, outer_arrays, outer_vertices, outer_bbox, outer_layer = polygons[j]
+            if i == j:
+                continue
+            if is_polygon_in_polygon(inner_vertices, outer_arrays):
                 # Update the layer name for the contained polygon
                 new_layer_name = f"{outer_layer} - Contained"
                 if not doc_in.layers.has_entry(new_layer_name):
                     doc_in.layers.new(name=new_layer_name)
 
                 # Update the layer of all entities in the contained polygon
-                for segment in inner_polygon:
-                    handle = segment["handle"]
-                    original_entity = doc_in.entitydb.get(handle)
-                    if original_entity:
-                        original_entity.dxf.layer = new_layer_name
+                for handle in inner_handles:
+                    final_layer_by_handle[handle] = new_layer_name
+
+    # Remove the replaced lines: destroying them through the entity database
+    # and purging the modelspace once avoids a list removal per line
+    for line in to_delete:
+        doc_in.entitydb.delete_entity(line)
+    msp_in.purge()
+
+    # Move arcs, splines and polylines to their final layers in one pass
+    for handle, layer in final_layer_by_handle.items():
+        ent_by_handle[handle].dxf.layer = layer
 
     # 8) Assign circles to a separate layer or check if they are inside a closed polygon
     circle_layer_name = "Individual Circles"
     if not doc_in.layers.has_entry(circle_layer_name):
         doc_in.layers.new(name=circle_layer_name)
 
-    for circle in msp_in.query("CIRCLE"):
+    for circle in by_type["CIRCLE"]:
         center = (circle.dxf.center.x, circle.dxf.center.y)
         radius = circle.dxf.radius
+        center_bbox = (center[0], center[1], center[0], center[1])
 
-        # Check if the circle is inside any closed polygon
+        # Check if the circle is inside any closed polygon whose box holds its center
         inside_polygon = False
-        for polygon, layer_name in polygons:
-            if is_point_in_polygon(center, polygon):
-                wrapping_handle = polygon[0]["handle"]  # Use the handle of the first segment as the layer name
-                wrapping_entity = doc_in.entitydb.get(wrapping_handle)
-                if wrapping_entity:
-                    circle_layer_name = f"{wrapping_entity.dxf.layer} - Contained"
+        for j in bboxes_containing(boxes, center_bbox).tolist():
+            poly_handles, poly_arrays, vertices, bbox, layer_name = polygons[j]
+            if is_point_in_polygon(center, poly_arrays):
+                wrapping_handle = poly_handles[0]  # Use the handle of the first segment as the layer name
+                wrapping_layer = final_layer_by_handle.get(wrapping_handle)
+                if wrapping_layer:
+                    circle_layer_name = f"{wrapping_layer} - Contained"
                 # circle_layer_name = f"Part {i+1} - Inside Circles"
                 break
 
         # Assign the circle to the appropriate layer
         circle.dxf.layer = circle_layer_name
+        final_layer_by_handle[circle.dxf.handle] = circle_layer_name
 
     # 9) Sort entities by numeric layer name before saving
-    # Extract all entities from the modelspace
-    entities = msp_in.query("*")
+    # Lines were all replaced, and arcs, splines and circles are all tracked
+    # already; only entities we never touched still need their layer read
+    for entity in by_type["OTHER"]:
+        final_layer_by_handle[entity.dxf.handle] = entity.dxf.layer
 
     # Update the redraw order based on the sorted entities
     msp_in.set_redraw_order(
-        (entity.dxf.handle, 10000 - extract_numeric_layer_name(entity.dxf.layer) ) 
-        for entity in entities)
+        (handle, 10000 - extract_numeric_layer_name(layer))
+        for handle, layer in final_layer_by_handle.items())
 
 
     # 10) Save the modified DXF to a new file
@@ -0,0 +1,97 @@
+import ezdxf
+import numpy as np
+
+import DXFAutoJoin
+
+
+def run_tool(tmp_path, build, tolerance=0.01):
+    """Build a drawing with build(msp), run the tool on it, return the output msp."""
+    doc = ezdxf.new("R2018")
+    build(doc.modelspace())
+    src = tmp_path / "input.dxf"
+    dst = tmp_path / "output.dxf"
+    doc.saveas(src)
+    DXFAutoJoin.unify_to_layers_in_place(str(src), str(dst), tolerance=tolerance)
+    return ezdxf.readfile(dst).modelspace()
+
+
+def test_spline_endpoints_join_lines(tmp_path):
+    # Spline control points are 3D; only x, y take part in endpoint merging
+    def build(msp):
+        msp.add_line((0, 0), (10, 0))
+        msp.add_line((10, 0), (10, 10))
+        msp.add_open_spline([(10, 10, 0), (5, 15, 0), (0, 12, 0), (0, 10.005, 0)])
+        msp.add_line((0, 10), (0, 0))
+
+    msp = run_tool(tmp_path, build)
+    layers = {e.dxftype(): e.dxf.layer for e in msp}
+    assert layers["SPLINE"] == "Part 1 - Join Manually!"
+    assert layers["LWPOLYLINE"] == "Part 1 - Join Manually!"
+
+
+def test_short_segments_are_not_chained_together(tmp_path):
+    # 200 collinear lines, each shorter than the tolerance: merging must not
+    # chain from one neighbour to the next and collapse the whole run
+    def build(msp):
+        for k in range(200):
+            msp.add_line((k * 0.006, 0), ((k + 1) * 0.006, 0))
+
+    msp = run_tool(tmp_path, build)
+    (polyline,) = msp.query("LWPOLYLINE")
+    xs = np.array([x for x, y in polyline.get_points("xy")])
+    assert len(np.unique(xs)) >= 100
+    assert xs.max() - xs.min() > 1.18
+
+
+def test_merged_points_stay_within_tolerance():
+    tolerance = 0.01
+    xs = np.arange(201) * 0.006
+    entities = {
+        "types": np.array(["LINE"] * 200),
+        "handles": [str(k) for k in range(200)],
+        "starts": np.column_stack((xs[:-1], np.zeros(200))),
+        "ends": np.column_stack((xs[1:], np.zeros(200))),
+        "centers": np.full((200, 2), np.nan),
+        "radii": np.full(200, np.nan),
+        "start_angles": np.full(200, np.nan),
+        "end_angles": np.full(200, np.nan),
+    }
+    starts = entities["starts"].copy()
+    entities = DXFAutoJoin.unify_endpoints(entities, tolerance=tolerance)
+    moved = np.hypot(*(entities["starts"] - starts).T)
+    assert moved.max() <= tolerance
+
+
+def test_nested_outlines_are_contained(tmp_path):
+    def build(msp):
+        msp.add_lwpolyline([(0, 0), (30, 0), (30, 30), (0, 30)], close=True).explode()
+        msp.add_lwpolyline([(10, 10), (20, 10), (20, 20), (10, 20)], close=True).explode()
+        msp.add_circle((5, 5), 1)
+
+    msp = run_tool(tmp_path, build)
+    layers = sorted((e.dxftype(), e.dxf.layer) for e in msp)
+    assert layers == [("CIRCLE", "Part 1 - Contained"),
+                      ("LWPOLYLINE", "Part 1"),
+                      ("LWPOLYLINE", "Part 1 - Contained")]
+
+
+def test_open_chain_outside_box_is_not_contained(tmp_path):
+    # Ray-cast parity alone puts the left segment inside the right one
+    def build(msp):
+        msp.add_line((0, 0), (0, 5))
+        msp.add_line((10, -1), (10, 6))
+
+    msp = run_tool(tmp_path, build)
+    assert sorted(e.dxf.layer for e in msp) == ["Part 1", "Part 2"]
+
+
+def test_circle_left_of_chorded_outline_is_not_contained(tmp_path):
+    # The chord gives odd parity to points left of the square
+    def build(msp):
+        msp.add_lwpolyline([(10, 0), (20, 0), (20, 10), (10, 10)], close=True).explode()
+        msp.add_line((10, 0), (20, 10))
+        msp.add_circle((0, 5), 1)
+
+    msp = run_tool(tmp_path, build)
+    (circle,) = msp.query("CIRCLE")
+    assert circle.dxf.layer == "Individual Circles"